@@ -1,13 +1,12 @@
 #!/usr/bin/env python3
-from dataclasses import asdict
 from PIL import Image
 import uuid as _uuid
 
-from vllm import LLM, EngineArgs, SamplingParams
+from vllm import LLM, SamplingParams
 
 def make_engine_args(model_name: str):
     # Thêm hf_overrides để chỉ rõ kiến trúc Tarsier2 đã được đăng ký trong vLLM
-    return EngineArgs(
+    return dict(
         model=model_name,
         enforce_eager=True,
 
@@ -24,11 +23,9 @@ def make_engine_args(model_name: str):
 
 def run_image_inference(model_name: str, image_path: str, question: str):
     engine_args = make_engine_args(model_name)
-    # Chuyển sang dict để truyền thêm các tham số runtime (seed, mm cache)
-    engine_args_dict = asdict(engine_args) | {"seed": 1234, "mm_processor_cache_gb": 4}
 
-    # Khởi tạo LLM
-    llm = LLM(**engine_args_dict)
+    # Khởi tạo LLM, thêm các tham số runtime (seed, mm cache)
+    llm = LLM(**engine_args, seed=1234, mm_processor_cache_gb=4)
 
     # Mẫu prompt: dùng placeholder phù hợp với Tarsier2
     # Lưu ý: token placeholder cần khớp với tokenization/model expectation
@@ -1,4 +1,3 @@
-from dataclasses import asdict
 from PIL import Image
 from typing import List, Dict, Tuple, Optional
 import math
@@ -6,10 +5,10 @@ import os
 import os.path as osp
 import argparse
 from pathlib import Path
-from vllm import LLM, EngineArgs, SamplingParams
+from vllm import LLM, SamplingParams
 
 def make_engine_args(model_name: str, max_num_seqs: int = 4):
-    return EngineArgs(
+    return dict(
         model=model_name,
         # dtype="half", # dangerous: may cause instability 
         # kv_cache_dtype="fp8", # dangerous: may cause instability 
@@ -145,9 +144,8 @@ def run_batch_image_list_inference(model_name: str,
     list_configs: [{'list_path': str, 'question': str}]
     """
     engine_args = make_engine_args(model_name, max_num_seqs=batch_size)
-    engine_args_dict = asdict(engine_args) | {"seed": 1234, "mm_processor_cache_gb": 6}
 
-    llm = LLM(**engine_args_dict)
+    llm = LLM(**engine_args, seed=1234, mm_processor_cache_gb=6)
 
     all_tasks = []
     for config in list_configs:
@@ -1,16 +1,27 @@
-from dataclasses import asdict
 from PIL import Image
 import uuid as _uuid
 import av
-from typing import List, Dict, Tuple
+import numpy as np
+from typing import List, Dict, Tuple, TYPE_CHECKING
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import math
+import os
 import os.path as osp
 
+try:
+    from .tarsier_decode import scan_packets, sample_target_times, decode_targets_parallel
+except ImportError:
+    # Run as a script: this directory is on sys.path instead of the package
+    from tarsier_decode import scan_packets, sample_target_times, decode_targets_parallel
 
-from vllm import LLM, EngineArgs, SamplingParams
+# vLLM and torch are imported where they are used: the spawn-based decode
+# workers re-import this script as __mp_main__ and must stay lightweight
+if TYPE_CHECKING:
+    from vllm import LLM
 
-def make_engine_args(model_name: str, max_num_seqs: int = 4):
-    return EngineArgs(
+def make_engine_args(model_name: str, max_num_seqs: int = 8):
+    return dict(
         model=model_name,
         # dtype="half", # dangerous: may cause instability 
         # kv_cache_dtype="fp8", # dangerous: may cause instability 
@@ -29,6 +40,21 @@ def make_engine_args(model_name: str, max_num_seqs: int = 4):
         max_num_batched_tokens=16384,
     )
 
+def build_engine(model_name: str, max_num_seqs: int = 8) -> "LLM":
+    """
+    Build the Tarsier vLLM engine once so it can be reused across videos
+    (engine construction and warmup dominate the cost of short runs).
+    """
+    from vllm import LLM
+
+    # Frames may be decoding on a background thread (FFmpeg/NVDEC, CUDA, the
+    # decode pool) while the engine starts; forking its engine-core process
+    # from that multi-threaded state can deadlock the child, so spawn it
+    os.environ.setdefault("VLLM_WORKER_MULTIPROC_METHOD", "spawn")
+
+    engine_args = make_engine_args(model_name, max_num_seqs=max_num_seqs)
+    return LLM(**engine_args, seed=1234, mm_processor_cache_gb=6)
+
 def get_video_info(video_path: str) -> Tuple[float, float, int]:
     """Get video FPS, duration, and total frames"""
     container = av.open(video_path)
@@ -41,10 +67,19 @@ def get_video_info(video_path: str) -> Tuple[float, float, int]:
 
 def extract_frames_pyav(video_path: str, max_frames: int = 128, min_fps: float = 2.0, 
                         resize_to: Tuple[int, int] = (480, 270), 
-                        start_time: float = None, end_time: float = None, save_preview: bool = True) -> List[Image.Image]:
+                        start_time: float = None, end_time: float = None, save_preview: bool = False,
+                        num_workers: int = None, hwaccel: str = None,
+                        device: str = "cpu",
+                        packet_scan: Tuple[List[float], float, float] = None) -> List[np.ndarray]:
     """
     Extract frames ensuring at least min_fps frames per second
     
+    The sample timestamps are chosen up front (uniform over the segment) and
+    only the frames at those timestamps are decoded, seeking GOP by GOP;
+    groups of GOPs are decoded concurrently in worker processes.
+    With device="cuda" frames are instead decoded on NVDEC and converted and
+    resized on the GPU; only the resized frames are copied back to the host.
+
     Args:
         video_path: Path to video file
         max_frames: Maximum number of frames to extract
@@ -52,69 +87,82 @@ def extract_frames_pyav(video_path: str, max_frames: int = 128, min_fps: float =
         resize_to: Resize dimensions (width, height)
         start_time: Start time in seconds (for video chunks)
         end_time: End time in seconds (for video chunks)
+        save_preview: Also write a mosaic of the frames (debugging aid; saved on a background thread)
+        num_workers: Number of decode processes (default: half the CPU count)
+        hwaccel: PyAV hardware decoder device type (e.g. "cuda"); None (default)
+            decodes in software on the process pool. A hardware decoder runs in
+            this process only: each NVDEC context takes hundreds of MB of GPU
+            memory next to vLLM, so leave headroom below gpu_memory_utilization
+        device: Where frames are converted and resized: "cpu" (libswscale) or
+            "cuda" (NVDEC + torch). Frames are (H, W, 3) uint8 numpy arrays either way
+        packet_scan: Result of scan_packets(video_path), to avoid demuxing the
+            whole file again for every chunk of the same video
     """
-    container = av.open(video_path)
-    stream = container.streams.video[0]
-    video_fps = float(stream.average_rate)
-    
-    # Seek to start time if specified
-    if start_time:
-        container.seek(int(start_time * av.time_base))
-    
-    frames = []
-    frame_times = []
-    
-    for frame in container.decode(video=0):
-        frame_time = float(frame.time)
-        
-        # Skip frames before start_time
-        if start_time and frame_time < start_time:
-            continue
-        
-        # Stop if we've reached end_time
-        if end_time and frame_time > end_time:
-            break
-            
-        img = frame.to_image()  
-        if resize_to:
-            img = img.resize(resize_to, Image.LANCZOS)
-        frames.append(img)
-        frame_times.append(frame_time)
+    keyframe_times, first_time, last_time = packet_scan or scan_packets(video_path)
+    targets = sample_target_times(first_time, last_time, max_frames, min_fps,
+                                   start_time=start_time, end_time=end_time)
 
-    container.close()
+    decoded = None
+    if device == "cuda":
+        try:
+            try:
+                from .tarsier_decode_gpu import decode_targets_cuda
+            except ImportError:
+                from tarsier_decode_gpu import decode_targets_cuda
+            decoded = decode_targets_cuda(video_path, targets, keyframe_times, end_time, resize_to)
+        except (TypeError, AttributeError, ValueError, av.FFmpegError) as e:
+            # PyAV without hw frame output / DLPack export, or no NVDEC/CUDA on this host
+            print(f"Warning: GPU decoding unavailable, decoding on the CPU: {e}")
+
+    if decoded is None:
+        decoded = decode_targets_parallel(video_path, targets, keyframe_times, end_time, resize_to,
+                                           num_workers, hwaccel)
+
+    decoded.sort(key=lambda item: item[0])
+    frames = [img for _, img in decoded]
     
     if len(frames) == 0:
         raise RuntimeError("No frames extracted.")
     
-    # Calculate the duration of extracted segment
-    duration = frame_times[-1] - frame_times[0] if len(frame_times) > 1 else 1.0
-    
-    # Calculate required frames for min_fps
-    required_frames = max(int(duration * min_fps), 1)
-    
-    # Use the smaller of max_frames and required_frames
-    target_frames = min(max_frames, required_frames)
-    
-    # Uniform sampling to get target_frames
-    if len(frames) > target_frames:
-        indices = [int(i * len(frames) / target_frames) for i in range(target_frames)]
-        frames = [frames[i] for i in indices]
-    
     if save_preview:
-        preview_width = 4
         chunk_label = "full" if start_time is None and end_time is None else f"{(start_time or 0):.2f}_{(end_time or 0):.2f}"
         preview_filename = f"{osp.splitext(osp.basename(video_path))[0]}_{chunk_label}_preview.jpg"
-        preview_height = (len(frames) + preview_width - 1) // preview_width
-        preview_image = Image.new('RGB', (resize_to[0] * preview_width, resize_to[1] * preview_height))
-        for idx, frame in enumerate(frames):
-            x = (idx % preview_width) * resize_to[0]
-            y = (idx // preview_width) * resize_to[1]
-            preview_image.paste(frame, (x, y))
-        
-        preview_image.save(preview_filename)
+        # Keep the JPEG encode off the critical path to the LLM
+        threading.Thread(target=_save_preview, args=(list(frames), preview_filename)).start()
 
     return frames
 
+def _save_preview(frames: List, preview_filename: str, preview_width: int = 4):
+    """
+    Tile frames into a preview_width-column mosaic and save it as an image.
+
+    The mosaic is composed with a single reshape/transpose: in numpy for host
+    frames, so the CPU path never imports torch, and on the frames' device
+    (followed by one host copy) for tensors.
+    """
+    if isinstance(frames[0], np.ndarray):
+        tiles = np.stack(frames)
+        n, h, w, c = tiles.shape
+        rows = (n + preview_width - 1) // preview_width
+        padding = np.zeros((rows * preview_width - n, h, w, c), dtype=tiles.dtype)
+        mosaic = (np.concatenate([tiles, padding])
+                  .reshape(rows, preview_width, h, w, c)
+                  .transpose(0, 2, 1, 3, 4)
+                  .reshape(rows * h, preview_width * w, c))
+    else:
+        import torch
+
+        tiles = torch.stack(frames)
+        n, h, w, c = tiles.shape
+        rows = (n + preview_width - 1) // preview_width
+        padding = tiles.new_zeros((rows * preview_width - n, h, w, c))
+        mosaic = (torch.cat([tiles, padding])
+                  .view(rows, preview_width, h, w, c)
+                  .permute(0, 2, 1, 3, 4)
+                  .reshape(rows * h, preview_width * w, c)
+                  .cpu().numpy())
+    Image.fromarray(mosaic).save(preview_filename)
+
 def split_video_chunks(video_path: str, max_frames: int = 128, min_fps: float = 2.0) -> List[Dict]:
     """
     Split video into chunks if it exceeds max_frames at min_fps
@@ -147,28 +195,100 @@ def split_video_chunks(video_path: str, max_frames: int = 128, min_fps: float =
     return chunks
 
 
-def run_batch_video_inference(model_name: str, video_configs: List[Dict], batch_size: int = 4, 
+def _prepare_batch_inputs(batch_tasks: List[Dict], max_frames: int, min_fps: float,
+                          resize_to: Tuple[int, int], decode_device: str = "cpu",
+                          hwaccel: str = None,
+                          packet_scans: Dict[str, Tuple[List[float], float, float]] = None) -> List[Dict]:
+    """
+    Extract frames and build vLLM inputs for one batch of tasks (CPU-bound stage).
+
+    packet_scans caches scan_packets() per video path across batches, so each
+    file is demuxed once no matter how many chunks it is split into.
+    """
+    if packet_scans is None:
+        packet_scans = {}
+    batch_inputs = []
+    for task in batch_tasks:
+        if task['video_path'] not in packet_scans:
+            packet_scans[task['video_path']] = scan_packets(task['video_path'])
+
+        # Extract frames for this chunk
+        frames = extract_frames_pyav(
+            task['video_path'],
+            max_frames=max_frames,
+            min_fps=min_fps,
+            resize_to=resize_to,
+            start_time=task['chunk']['start_time'],
+            end_time=task['chunk']['end_time'],
+            hwaccel=hwaccel,
+            device=decode_device,
+            packet_scan=packet_scans[task['video_path']],
+        )
+        
+        chunk_id = task['chunk']['chunk_id']
+        chunk_info = ""
+        if task['chunk']['start_time'] is not None:
+            chunk_info = f" (Chunk {chunk_id + 1}: {task['chunk']['start_time']:.1f}s - {task['chunk']['end_time']:.1f}s)"
+        
+        print(f"  - {task['video_path']}{chunk_info}: {len(frames)} frames", flush=True)
+        
+        # Build prompt
+        prompt = (
+            "<|im_start|>system\nYou are a helpful assistant.<|im_end|>\n"
+            "<|im_start|>user\n<|vision_start|><|video_pad|>"
+            f"{task['question']}<|im_end|>\n"
+            "<|im_start|>assistant\n"
+        )
+        
+        # One video is a single (T, H, W, 3) uint8 array: vLLM reads a list
+        # of arrays as one video per element
+        batch_inputs.append({
+            "prompt": prompt,
+            "multi_modal_data": {"video": np.stack(frames)},
+        })
+    return batch_inputs
+
+def run_batch_video_inference(model_name: str, video_configs: List[Dict], batch_size: int = None, 
                                max_frames: int = 128, min_fps: float = 2.0, 
-                               resize_to: Tuple[int, int] = (480, 270)):
+                               resize_to: Tuple[int, int] = (480, 270), decode_device: str = "cpu",
+                               hwaccel: str = None, max_num_seqs: int = 8, llm: "LLM" = None):
     """
     Run inference on multiple videos in batches
+
+    By default every video chunk is submitted in a single llm.generate call so
+    vLLM's scheduler can interleave prefill/decode across all of them
+    (continuous batching); max_num_seqs bounds how many run concurrently.
+
+    Frame extraction runs on a background thread: the first batch is decoded
+    while the engine is being built, and each following batch is decoded
+    while the GPU works on the previous one.
     
     Args:
         model_name: Model name/path
         video_configs: List of dicts with 'video_path' and 'question'
-        batch_size: Number of videos to process in parallel
+        batch_size: Number of video chunks per generate call (None: all at once).
+            Set it to bound host memory for frames on very large video lists.
         max_frames: Maximum frames per chunk
         min_fps: Minimum frames per second
         resize_to: Resize dimensions
+        decode_device: "cuda" to decode, convert and resize frames on the GPU
+            (see extract_frames_pyav)
+        hwaccel: PyAV hardware decoder device type (e.g. "cuda") for the CPU
+            frame path; None decodes in software on the process pool. Hardware
+            decoding runs in a single process, but its NVDEC context still
+            takes hundreds of MB of GPU memory outside vLLM's share (0.95 in
+            make_engine_args); with a prebuilt llm, leave room for it there
+        max_num_seqs: Maximum number of prompts the engine runs concurrently
+            (ignored when llm is given)
+        llm: Engine from build_engine() to reuse across calls. When None it is
+            built here, after decoding of the first batch has started, so the
+            two overlap; prefer that for a one-off call
         
     Returns:
         List of dicts with 'video_path', 'results' (list of chunk results)
     """
-    engine_args = make_engine_args(model_name, max_num_seqs=batch_size)
-    engine_args_dict = asdict(engine_args) | {"seed": 1234, "mm_processor_cache_gb": 6}
+    from vllm import SamplingParams
 
-    llm = LLM(**engine_args_dict)
-    
     # Prepare all tasks (video + chunk combinations)
     all_tasks = []
     for config in video_configs:
@@ -188,48 +308,37 @@ def run_batch_video_inference(model_name: str, video_configs: List[Dict], batch_
                 'original_index': len(all_tasks)
             })
     
+    batch_size = batch_size or max(len(all_tasks), 1)
+    batches = [all_tasks[i:i + batch_size] for i in range(0, len(all_tasks), batch_size)]
+
+    # Start decoding the first batch before the (slow) engine construction
+    # Single decode thread, so the packet scan cache needs no locking
+    decode_executor = ThreadPoolExecutor(max_workers=1)
+    packet_scans = {}
+    next_inputs = None
+    if batches:
+        next_inputs = decode_executor.submit(_prepare_batch_inputs, batches[0], max_frames, min_fps,
+                                           resize_to, decode_device, hwaccel, packet_scans)
+
+    if llm is None:
+        llm = build_engine(model_name, max_num_seqs=max_num_seqs)
+    
     # Process tasks in batches
     results_by_video = {config['video_path']: [] for config in video_configs}
+    sampling_params = SamplingParams(temperature=0.2, max_tokens=256)
     
-    for batch_start in range(0, len(all_tasks), batch_size):
-        batch_tasks = all_tasks[batch_start:batch_start + batch_size]
+    for batch_idx, batch_tasks in enumerate(batches):
+        print(f"\nProcessing batch {batch_idx + 1}/{len(batches)}", flush=True)
         
-        print(f"\nProcessing batch {batch_start//batch_size + 1}/{math.ceil(len(all_tasks)/batch_size)}", flush=True)
-        
-        batch_inputs = []
-        for task in batch_tasks:
-            # Extract frames for this chunk
-            frames = extract_frames_pyav(
-                task['video_path'],
-                max_frames=max_frames,
-                min_fps=min_fps,
-                resize_to=resize_to,
-                start_time=task['chunk']['start_time'],
-                end_time=task['chunk']['end_time']
-            )
-            
-            chunk_id = task['chunk']['chunk_id']
-            chunk_info = ""
-            if task['chunk']['start_time'] is not None:
-                chunk_info = f" (Chunk {chunk_id + 1}: {task['chunk']['start_time']:.1f}s - {task['chunk']['end_time']:.1f}s)"
-            
-            print(f"  - {task['video_path']}{chunk_info}: {len(frames)} frames", flush=True)
-            
-            # Build prompt
-            prompt = (
-                "<|im_start|>system\nYou are a helpful assistant.<|im_end|>\n"
-                "<|im_start|>user\n<|vision_start|><|video_pad|>"
-                f"{task['question']}<|im_end|>\n"
-                "<|im_start|>assistant\n"
-            )
-            
-            batch_inputs.append({
-                "prompt": prompt,
-                "multi_modal_data": {"video": frames},
-            })
+        batch_inputs = next_inputs.result()
+
+        # Decode the next batch while this one runs on the GPU
+        if batch_idx + 1 < len(batches):
+            next_inputs = decode_executor.submit(_prepare_batch_inputs, batches[batch_idx + 1],
+                                                 max_frames, min_fps, resize_to, decode_device,
+                                                 hwaccel, packet_scans)
         
         # Run inference on batch
-        sampling_params = SamplingParams(temperature=0.2, max_tokens=256)
         outputs = llm.generate(batch_inputs, sampling_params=sampling_params)
         
         # Collect results
@@ -241,6 +350,8 @@ def run_batch_video_inference(model_name: str, video_configs: List[Dict], batch_
                 'end_time': task['chunk']['end_time'],
                 'text': text
             })
+
+    decode_executor.shutdown()
     
     # Organize results by video
     final_results = []
@@ -268,16 +379,19 @@ def run_batch_video_inference(model_name: str, video_configs: List[Dict], batch_
     return final_results
 
 def run_single_video_inference(model_name: str, video_path: str, question: str, 
-                               max_frames: int = 128, min_fps: float = 2.0):
+                               max_frames: int = 128, min_fps: float = 2.0, llm: "LLM" = None):
     """
     Run inference on a single video (wrapper for backward compatibility)
+
+    Pass an engine from build_engine() as llm when calling this in a loop,
+    otherwise a new engine is built for every video.
     """
     results = run_batch_video_inference(
         model_name=model_name,
         video_configs=[{'video_path': video_path, 'question': question}],
-        batch_size=1,
         max_frames=max_frames,
-        min_fps=min_fps
+        min_fps=min_fps,
+        llm=llm
     )
     
     return results[0]
@@ -304,10 +418,12 @@ if __name__ == "__main__":
         },
     ]
     
+    # A single call: let it build the engine, so the first batch is decoded
+    # while the engine starts (pass llm=build_engine(...) to reuse one across calls)
     batch_results = run_batch_video_inference(
         model_name=MODEL,
         video_configs=video_configs,
-        batch_size=4,  # Process 4 videos/chunks in parallel
+        max_num_seqs=8,  # Run up to 8 videos/chunks concurrently
         max_frames=128,
         min_fps=2
     )
@@ -0,0 +1,189 @@
+"""
+CPU video decoding helpers for gen_video_desc.
+
+Kept free of torch/vLLM imports: the decode pool uses the spawn start method,
+so every worker imports this module (and the main script) on start-up.
+"""
+import bisect
+import math
+import multiprocessing as mp
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import av
+from av.codec.hwaccel import HWAccel
+from av.video.reformatter import Interpolation
+import numpy as np
+
+
+def scan_packets(video_path: str) -> Tuple[List[float], float, float]:
+    """
+    Packet-only demux (no decoding) of the video stream.
+
+    Returns:
+        (keyframe_times, first_time, last_time) in seconds
+    """
+    container = av.open(video_path)
+    stream = container.streams.video[0]
+    keyframe_times = []
+    first_pts = last_pts = None
+    for packet in container.demux(stream):
+        if packet.pts is None:
+            continue
+        if packet.is_keyframe:
+            keyframe_times.append(float(packet.pts * stream.time_base))
+        first_pts = packet.pts if first_pts is None else min(first_pts, packet.pts)
+        last_pts = packet.pts if last_pts is None else max(last_pts, packet.pts)
+    time_base = stream.time_base
+    container.close()
+    if first_pts is None:
+        raise RuntimeError("No frames extracted.")
+    return sorted(keyframe_times), float(first_pts * time_base), float(last_pts * time_base)
+
+def sample_target_times(first_time: float, last_time: float, max_frames: int, min_fps: float,
+                        start_time: float = None, end_time: float = None) -> List[float]:
+    """Uniformly spaced timestamps over the segment, at least min_fps and at most max_frames."""
+    seg_start = max(start_time, first_time) if start_time else first_time
+    seg_end = min(end_time, last_time) if end_time else last_time
+
+    # Calculate the duration of the segment
+    duration = seg_end - seg_start if seg_end > seg_start else 1.0
+
+    # Calculate required frames for min_fps
+    required_frames = max(int(duration * min_fps), 1)
+
+    # Use the smaller of max_frames and required_frames
+    target_frames = min(max_frames, required_frames)
+
+    return [seg_start + i * duration / target_frames for i in range(target_frames)]
+
+def _split_targets(targets: List[float], keyframe_times: List[float], num_groups: int) -> List[List[float]]:
+    """
+    Split sorted target times into at most num_groups contiguous groups of similar
+    size, cutting only between GOPs so no two groups decode the same GOP.
+    """
+    size = math.ceil(len(targets) / max(num_groups, 1))
+    groups, current, last_gop = [], [], None
+    for t in targets:
+        gop = bisect.bisect_right(keyframe_times, t)
+        if len(current) >= size and gop != last_gop:
+            groups.append(current)
+            current = []
+        current.append(t)
+        last_gop = gop
+    if current:
+        groups.append(current)
+    return groups
+
+def iter_target_frames(container, stream, targets: List[float], keyframe_times: List[float],
+                       end_time: float = None):
+    """
+    Yield (time, frame) for the first frame at or after each target time.
+
+    Instead of decoding the whole segment, seek to the keyframe preceding a
+    target whenever that keyframe lies beyond the current decode position,
+    and only decode forward from there. Each frame is yielded at most once.
+    """
+    decoder = None
+    position = None
+    for target in targets:
+        idx = bisect.bisect_right(keyframe_times, target) - 1
+        keyframe = keyframe_times[idx] if idx >= 0 else target
+        if decoder is None or position is None or keyframe > position:
+            container.seek(round(keyframe / stream.time_base), stream=stream, any_frame=False, backward=True)
+            decoder = container.decode(stream)
+            position = None
+
+        for frame in decoder:
+            frame_time = float(frame.time)
+            position = frame_time
+
+            # Stop if we've reached end_time
+            if end_time and frame_time > end_time:
+                return
+            if frame_time >= target:
+                yield frame_time, frame
+                break
+        else:
+            return
+
+def _open_video(video_path: str, hwaccel: str = None):
+    """
+    Open a video for decoding, on a hardware decoder if requested.
+
+    hwaccel is a PyAV device type ("cuda", "videotoolbox", "d3d11va", ...).
+    Codecs the device cannot handle fall back to software decoding, and so
+    does a PyAV build/host without hardware decoding support.
+    """
+    if hwaccel:
+        try:
+            return av.open(video_path, hwaccel=HWAccel(device_type=hwaccel, allow_software_fallback=True))
+        except (TypeError, ValueError, av.FFmpegError) as e:
+            print(f"Warning: hardware decoding ({hwaccel}) unavailable, using software: {e}")
+    return av.open(video_path)
+
+def _decode_targets(video_path: str, targets: List[float], keyframe_times: List[float],
+                    end_time: float, resize_to: Tuple[int, int],
+                    hwaccel: str = None) -> List[Tuple[float, np.ndarray]]:
+    """
+    Decode the frames for a group of target times.
+    Runs in a pool worker (in-process for hardware decoding): reopens the
+    file and seeks per GOP.
+    """
+    container = _open_video(video_path, hwaccel)
+    stream = container.streams.video[0]
+
+    frames = []
+    for frame_time, frame in iter_target_frames(container, stream, targets, keyframe_times, end_time):
+        # libswscale fuses the YUV->RGB conversion and the Lanczos resize, straight
+        # into a numpy array (no PIL wrapping; the caller stacks the frames)
+        if resize_to:
+            arr = frame.to_ndarray(width=resize_to[0], height=resize_to[1], format="rgb24",
+                                   interpolation=Interpolation.LANCZOS)
+        else:
+            arr = frame.to_ndarray(format="rgb24")
+        frames.append((frame_time, arr))
+
+    container.close()
+    return frames
+
+_DECODE_POOL = None
+_DECODE_POOL_SIZE = 0
+
+def _get_decode_pool(num_workers: int) -> ProcessPoolExecutor:
+    """Lazily create (and reuse across calls) the process pool used for frame decoding."""
+    global _DECODE_POOL, _DECODE_POOL_SIZE
+    if _DECODE_POOL is None or _DECODE_POOL_SIZE != num_workers:
+        if _DECODE_POOL is not None:
+            _DECODE_POOL.shutdown()
+        # spawn: workers must not inherit the CUDA context of the parent process
+        _DECODE_POOL = ProcessPoolExecutor(max_workers=num_workers, mp_context=mp.get_context("spawn"))
+        _DECODE_POOL_SIZE = num_workers
+    return _DECODE_POOL
+
+def decode_targets_parallel(video_path: str, targets: List[float], keyframe_times: List[float],
+                            end_time: float, resize_to: Tuple[int, int], num_workers: int = None,
+                            hwaccel: str = None) -> List[Tuple[float, np.ndarray]]:
+    """
+    Decode the target frames as GOP-aligned groups spread over the decode process pool.
+
+    Software decoding only: with hwaccel the frames are decoded in this process,
+    so there is a single hardware decoder context (each one costs hundreds of
+    MB of GPU memory) rather than one per worker.
+    """
+    if hwaccel:
+        return _decode_targets(video_path, targets, keyframe_times, end_time, resize_to, hwaccel)
+
+    if num_workers is None:
+        num_workers = max(1, (os.cpu_count() or 1) // 2)
+
+    groups = _split_targets(targets, keyframe_times, num_workers)
+
+    if len(groups) == 1:
+        return _decode_targets(video_path, groups[0], keyframe_times, end_time, resize_to)
+
+    pool = _get_decode_pool(num_workers)
+    futures = [pool.submit(_decode_targets, video_path, group, keyframe_times, end_time, resize_to)
+               for group in groups]
+    return [item for future in futures for item in future.result()]
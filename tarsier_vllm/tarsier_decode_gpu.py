@@ -0,0 +1,106 @@
+"""
+GPU video decoding for gen_video_desc: NVDEC frames are exported through
+DLPack and converted/resized with torch, then copied to the host once.
+
+Imported lazily (only for device="cuda") so the CPU decode workers never
+pay for the torch/torchvision imports.
+"""
+from typing import List, Tuple
+
+import av
+from av.codec.hwaccel import HWAccel
+import numpy as np
+import torch
+import torchvision.transforms.v2.functional as TF
+from torchvision.transforms import InterpolationMode
+
+try:
+    from .tarsier_decode import iter_target_frames
+except ImportError:
+    from tarsier_decode import iter_target_frames
+
+
+# (Kr, Kb) luma coefficients by AVColorSpace value
+_YUV_COEFFS = {
+    1: (0.2126, 0.0722),                          # BT.709
+    5: (0.299, 0.114), 6: (0.299, 0.114),         # BT.601 (BT470BG / SMPTE170M)
+    9: (0.2627, 0.0593), 10: (0.2627, 0.0593),    # BT.2020
+}
+
+def _yuv_params(frame) -> Tuple[float, float, bool]:
+    """Return (Kr, Kb, full_range) from the frame's colorspace and color range tags."""
+    # Untagged video: like FFmpeg, assume BT.709 for HD and BT.601 for SD
+    default = (0.2126, 0.0722) if frame.height >= 720 else (0.299, 0.114)
+    kr, kb = _YUV_COEFFS.get(getattr(frame, "colorspace", None), default)
+    # AVCOL_RANGE_JPEG (2) is full range; anything else is treated as limited
+    full_range = getattr(frame, "color_range", None) == 2
+    return kr, kb, full_range
+
+def _nv12_to_rgb(y: torch.Tensor, uv: torch.Tensor, height: int, width: int,
+                 kr: float = 0.2126, kb: float = 0.0722, full_range: bool = False) -> torch.Tensor:
+    """Convert NV12 planes to a float (3, H, W) RGB tensor on their device (BT.709 limited range by default)."""
+    y = y[:height, :width].float()
+    uv = uv[:height // 2, :width].reshape(height // 2, width // 2, 2).float() - 128.0
+    if not full_range:
+        y = (y - 16.0) * (255.0 / 219.0)
+        uv = uv * (255.0 / 224.0)
+    # Chroma is subsampled 2x in both directions
+    uv = uv.repeat_interleave(2, dim=0).repeat_interleave(2, dim=1)
+    u, v = uv[..., 0], uv[..., 1]
+    kg = 1.0 - kr - kb
+    r = y + 2.0 * (1.0 - kr) * v
+    g = y - (2.0 * kb * (1.0 - kb) / kg) * u - (2.0 * kr * (1.0 - kr) / kg) * v
+    b = y + 2.0 * (1.0 - kb) * u
+    return torch.stack([r, g, b])
+
+def _resize_frames_gpu(frames: torch.Tensor, resize_to: Tuple[int, int]) -> torch.Tensor:
+    """Resize a (N, 3, H, W) float RGB batch in one kernel call; returns (N, H', W', 3) uint8."""
+    if resize_to:
+        # torchvision has no Lanczos kernel; antialiased bicubic is the closest
+        frames = TF.resize(frames, [resize_to[1], resize_to[0]],
+                           interpolation=InterpolationMode.BICUBIC, antialias=True)
+    return frames.clamp_(0, 255).to(torch.uint8).permute(0, 2, 3, 1)
+
+# Frames converted per GPU resize call; bounds the full-resolution staging memory
+_GPU_RESIZE_BATCH = 16
+
+def decode_targets_cuda(video_path: str, targets: List[float], keyframe_times: List[float],
+                        end_time: float, resize_to: Tuple[int, int]) -> List[Tuple[float, np.ndarray]]:
+    """
+    Decode frames on NVDEC and convert them on the GPU: the NV12 surfaces are
+    exported through DLPack and converted to RGB and resized in batches with
+    torch. The resized frames are copied to the host in a single transfer and
+    returned as (H, W, 3) uint8 arrays, since vLLM only takes host video data
+    (it calls .numpy() on video tensors).
+    """
+    container = av.open(video_path, hwaccel=HWAccel(device_type="cuda", output_format="hw"))
+    stream = container.streams.video[0]
+
+    frame_times, resized = [], []
+    pending = []
+
+    def flush():
+        resized.append(_resize_frames_gpu(torch.stack(pending), resize_to))
+        pending.clear()
+
+    for frame_time, frame in iter_target_frames(container, stream, targets, keyframe_times, end_time):
+        if frame.format.name == "nv12":
+            y = torch.from_dlpack(frame.planes[0])
+            uv = torch.from_dlpack(frame.planes[1])
+            pending.append(_nv12_to_rgb(y, uv, frame.height, frame.width, *_yuv_params(frame)))
+        else:
+            # Software-decoded frame (e.g. yuv420p when NVDEC can't take the
+            # codec): let libswscale convert it, then upload the RGB frame
+            rgb = torch.from_numpy(frame.to_ndarray(format="rgb24")).to("cuda")
+            pending.append(rgb.permute(2, 0, 1).float())
+        frame_times.append(frame_time)
+        if len(pending) == _GPU_RESIZE_BATCH:
+            flush()
+
+    if pending:
+        flush()
+    container.close()
+    if not resized:
+        return []
+    # Only the resized frames cross PCIe, in one device-to-host copy
+    return list(zip(frame_times, torch.cat(resized).cpu().numpy()))
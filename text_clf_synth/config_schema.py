@@ -1,7 +1,7 @@
 """Configuration schema for text-clf-synth dataset generation."""
 
 from enum import Enum
-from typing import List, Optional, Union
+from typing import List, Literal, Optional, Union
 from pydantic import BaseModel, Field, field_validator
 
 
@@ -52,7 +52,18 @@ class ModelConfig(BaseModel):
     temperature: float = Field(0.8, ge=0.0, le=2.0, description="Sampling temperature")
     max_tokens: int = Field(4096, gt=0, description="Maximum tokens to generate")
     tensor_parallel_size: int = Field(1, gt=0, description="Number of GPUs for tensor parallelism")
-    quantization: Optional[str] = Field(None, description="Quantization method (awq, gptq, etc.)")
+    quantization: Optional[str] = Field(None, description="Quantization method (awq, gptq, fp8, etc.); None uses the checkpoint's config (AWQ then runs on Marlin kernels when supported)")
+    dtype: str = Field("bfloat16", description="Activation dtype; bfloat16 falls back to 'auto' on pre-Ampere GPUs and AWQ checkpoints")
+    kv_cache_dtype: Literal["auto", "fp8", "fp8_e4m3", "fp8_e5m2"] = Field(
+        "auto",
+        description="KV cache dtype; fp8 (e4m3, Hopper/Ada) or fp8_e5m2 (Ampere) halves KV memory at a small accuracy cost",
+    )
+    max_model_len: Optional[int] = Field(None, gt=0, description="Context length; None estimates it from the prompt length and max_tokens")
+    max_num_seqs: Optional[int] = Field(None, gt=0, description="Maximum concurrent sequences; None uses min(num_samples, 256)")
+    gpu_memory_utilization: Optional[float] = Field(None, gt=0.0, le=1.0, description="Fraction of GPU memory for vLLM; None uses 0.95 (eager) or 0.9 (CUDA graphs)")
+    enforce_eager: bool = Field(False, description="Disable CUDA graph capture (faster start-up, slower decoding)")
+    speculative_model: Optional[Literal["[ngram]"]] = Field(None, description="'[ngram]' for prompt-lookup speculative decoding (draft models are not supported by the pinned vLLM)")
+    num_speculative_tokens: int = Field(5, gt=0, description="Draft tokens proposed per step when speculative decoding is enabled")
 
 
 class OutputConfig(BaseModel):
@@ -80,9 +91,11 @@ class RootConfig(BaseModel):
     @classmethod
     def validate_fields_unique(cls, v):
         """Ensure field names are unique."""
-        names = [f.name for f in v]
-        if len(names) != len(set(names)):
-            raise ValueError("Field names must be unique")
+        seen = set()
+        for f in v:
+            if f.name in seen:
+                raise ValueError(f"Duplicate field name: {f.name}")
+            seen.add(f.name)
         return v
     
     @field_validator('dataset')
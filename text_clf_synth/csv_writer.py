@@ -4,7 +4,7 @@ import csv
 import os
 from pathlib import Path
 from typing import List, Dict, Any, Optional
-import random
+import numpy as np
 
 
 class CSVWriter:
@@ -40,6 +40,9 @@ class CSVWriter:
     def write_data(self, samples: List[Dict[str, Any]]):
         """Write samples to CSV files with train/test split.
         
+        The split is computed as index permutations, so samples are never
+        copied; each file is then written in a single pass.
+        
         Args:
             samples: List of data samples (dicts)
         """
@@ -49,94 +52,89 @@ class CSVWriter:
         
         # Split data
         if self.stratify_field and self.stratify_field in samples[0]:
-            train_samples, test_samples = self._stratified_split(samples)
+            train_idx, test_idx = self._stratified_split(samples)
         else:
-            train_samples, test_samples = self._random_split(samples)
+            train_idx, test_idx = self._random_split(samples)
         
-        print(f"Writing {len(train_samples)} training samples to {self.train_file}")
-        print(f"Writing {len(test_samples)} test samples to {self.test_file}")
+        print(f"Writing {len(train_idx)} training samples to {self.train_file}")
+        print(f"Writing {len(test_idx)} test samples to {self.test_file}")
         
         # Write CSVs
-        self._write_csv(self.train_file, train_samples)
-        self._write_csv(self.test_file, test_samples)
+        self._write_csv(self.train_file, samples, train_idx)
+        self._write_csv(self.test_file, samples, test_idx)
         
         print("CSV files written successfully!")
     
     def _random_split(
         self,
         samples: List[Dict[str, Any]]
-    ) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    ) -> tuple[np.ndarray, np.ndarray]:
         """Randomly split samples into train/test.
         
         Args:
             samples: List of data samples
         
         Returns:
-            Tuple of (train_samples, test_samples)
+            Tuple of (train_indices, test_indices) into samples
         """
-        # Shuffle samples
-        shuffled = samples.copy()
-        random.shuffle(shuffled)
+        # Shuffle indices
+        shuffled = np.random.permutation(len(samples))
         
         # Split
         split_idx = int(len(shuffled) * self.train_ratio)
-        train = shuffled[:split_idx]
-        test = shuffled[split_idx:]
-        
-        return train, test
+        return shuffled[:split_idx], shuffled[split_idx:]
     
     def _stratified_split(
         self,
         samples: List[Dict[str, Any]]
-    ) -> tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    ) -> tuple[np.ndarray, np.ndarray]:
         """Split samples with stratification by a categorical field.
         
         Args:
             samples: List of data samples
         
         Returns:
-            Tuple of (train_samples, test_samples)
+            Tuple of (train_indices, test_indices) into samples
         """
-        # Group by stratify field
-        groups = {}
-        for sample in samples:
-            key = sample[self.stratify_field]
-            if key not in groups:
-                groups[key] = []
-            groups[key].append(sample)
+        # Group indices by stratify field: a stable argsort of the group ids
+        # lays the groups out contiguously, then split at the group counts
+        keys = np.array([sample[self.stratify_field] for sample in samples])
+        _, group_ids, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        groups = np.split(np.argsort(group_ids, kind='stable'), np.cumsum(counts)[:-1])
         
         # Split each group
         train = []
         test = []
         
-        for group_samples in groups.values():
+        for group_idx in groups:
             # Shuffle group
-            shuffled = group_samples.copy()
-            random.shuffle(shuffled)
+            shuffled = np.random.permutation(group_idx)
             
             # Split group
             split_idx = int(len(shuffled) * self.train_ratio)
-            train.extend(shuffled[:split_idx])
-            test.extend(shuffled[split_idx:])
+            train.append(shuffled[:split_idx])
+            test.append(shuffled[split_idx:])
         
         # Shuffle final sets
-        random.shuffle(train)
-        random.shuffle(test)
+        train = np.random.permutation(np.concatenate(train))
+        test = np.random.permutation(np.concatenate(test))
         
         return train, test
     
-    def _write_csv(self, filepath: str, samples: List[Dict[str, Any]]):
-        """Write samples to a CSV file.
+    def _write_csv(self, filepath: str, samples: List[Dict[str, Any]], indices: np.ndarray):
+        """Write the selected samples to a CSV file.
         
         Args:
             filepath: Path to CSV file
             samples: List of data samples
+            indices: Indices of the samples to write, in output order
         """
         with open(filepath, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=self.field_names)
-            writer.writeheader()
+            writer = csv.writer(f)
+            writer.writerow(self.field_names)
             
-            for sample in samples:
-                # Only write fields that are in field_names
-                row = {k: sample.get(k, '') for k in self.field_names}
-                writer.writerow(row)
+            # Only write fields that are in field_names
+            writer.writerows(
+                [samples[i].get(k, '') for k in self.field_names]
+                for i in indices
+            )
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """Generate IELTS Task 2 synthetic dataset."""
 
+import logging
 import sys
 from pathlib import Path
 
@@ -10,6 +11,9 @@ print(f"Importing libs from {str(Path(__file__).parent.parent.parent)}")
 
 from text_clf_synth import DatasetGenerator
 
+# Show the client's start-up info (dtype, KV cache blocks, ...)
+logging.basicConfig(level=logging.INFO)
+
 config_path = Path(__file__).parent / "ielts_task2.yaml"
 
 print("IELTS Task 2 Dataset Generator", flush=True)
@@ -18,6 +22,6 @@ print("=" * 60, flush=True)
 # Initialize generator
 generator = DatasetGenerator(str(config_path))
 
-# Generate dataset (batch_size=1 for better quality with reasoning)
-generator.generate(batch_size=50)
+# Generate dataset (all prompts are submitted to vLLM at once)
+generator.generate()
 
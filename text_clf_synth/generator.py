@@ -1,15 +1,18 @@
 """Main dataset generator orchestrator."""
 
+import asyncio
+from functools import partial
 import yaml
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from transformers import AutoTokenizer
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TimeRemainingColumn
 
 from .config_schema import RootConfig
 from .vllm_client import VLLMClient
 from .reasoning_parser import ReasoningParser
 from .csv_writer import CSVWriter
-from .prompts import SYSTEM_PROMPT, build_generation_prompt
+from .prompts import SYSTEM_PROMPT, build_prompt_prefix, build_generation_prompt
 
 
 class DatasetGenerator:
@@ -24,6 +27,9 @@ class DatasetGenerator:
         self.config_path = config_path
         self.config = self._load_config(config_path)
         
+        # Shared by every sample prompt (enables vLLM prefix caching)
+        self._prompt_prefix = build_prompt_prefix(self.config.fields)
+        
         print(f"Loaded config: {self.config.dataset.name}")
         print(f"  Samples: {self.config.dataset.num_samples}")
         print(f"  Fields: {[f.name for f in self.config.fields]}")
@@ -44,11 +50,12 @@ class DatasetGenerator:
         config = RootConfig(**data)
         return config
     
-    def generate(self, batch_size: int = 5):
+    def generate(self, batch_size: Optional[int] = None):
         """Generate the complete dataset.
         
         Args:
-            batch_size: Number of samples to generate per LLM call
+            batch_size: Maximum number of prompts per LLM call. By default all
+                prompts are submitted at once and vLLM batches them internally.
         """
         print("\n" + "="*60)
         print(f"Starting dataset generation: {self.config.dataset.name}")
@@ -56,12 +63,25 @@ class DatasetGenerator:
         
         # Initialize components
         print("Step 1: Initializing vLLM client...")
+        # All prompts are submitted at once: let the scheduler run as many
+        # of them concurrently as the workload has (up to vLLM's default cap)
+        max_num_seqs = self.config.model.max_num_seqs or min(self.config.dataset.num_samples, 256)
+        max_model_len = self.config.model.max_model_len or self._estimate_max_model_len()
+        print(f"  Max model len: {max_model_len}, max num seqs: {max_num_seqs}")
         client = VLLMClient(
             model_path=self.config.model.name,
             temperature=self.config.model.temperature,
             max_tokens=self.config.model.max_tokens,
             tensor_parallel_size=self.config.model.tensor_parallel_size,
             quantization=self.config.model.quantization,
+            dtype=self.config.model.dtype,
+            kv_cache_dtype=self.config.model.kv_cache_dtype,
+            enforce_eager=self.config.model.enforce_eager,
+            speculative_model=self.config.model.speculative_model,
+            num_speculative_tokens=self.config.model.num_speculative_tokens,
+            gpu_memory_utilization=self.config.model.gpu_memory_utilization,
+            max_model_len=max_model_len,
+            max_num_seqs=max_num_seqs,
         )
         
         print("\nStep 2: Initializing parser...")
@@ -87,28 +107,90 @@ class DatasetGenerator:
         print(f"Training data: {self.config.output.train_file}")
         print(f"Test data: {self.config.output.test_file}")
     
+    def _estimate_max_model_len(self, round_to: int = 256) -> int:
+        """Estimate the context length needed by the generation prompts.
+        
+        Every prompt is the shared prefix plus a sample number, so the longest
+        one (highest sample number, including retries) bounds them all.
+        
+        Args:
+            round_to: Round the result up to a multiple of this many tokens
+        
+        Returns:
+            Prompt tokens + max_tokens, rounded up
+        """
+        tokenizer = AutoTokenizer.from_pretrained(self.config.model.name, trust_remote_code=True)
+        longest_prompt = build_generation_prompt(
+            self.config.fields, 2 * self.config.dataset.num_samples, self._prompt_prefix
+        )
+        messages = [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": longest_prompt},
+        ]
+        prompt_len = len(tokenizer.apply_chat_template(messages, add_generation_prompt=True, tokenize=True))
+        needed = prompt_len + self.config.model.max_tokens
+        return -(-needed // round_to) * round_to
+    
+    @staticmethod
+    async def _stream_parse(
+        client: VLLMClient,
+        parser: ReasoningParser,
+        prompts: List[str],
+        on_sample: Optional[Callable[[], None]] = None,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Generate from prompts and parse each output as soon as it finishes.
+        
+        Parsing runs while the remaining requests are still decoding.
+        
+        Args:
+            client: vLLM client
+            parser: Reasoning parser
+            prompts: Generation prompts
+            on_sample: Called after each successfully parsed sample
+        
+        Returns:
+            (parsed samples, number of outputs that failed to parse)
+        """
+        samples = []
+        num_failed = 0
+        async for _, output in client.generate_stream(prompts, SYSTEM_PROMPT):
+            sample = parser.parse_json_output(output)
+            if sample:
+                samples.append(sample)
+                if on_sample:
+                    on_sample()
+            else:
+                num_failed += 1
+        return samples, num_failed
+    
     def _generate_samples(
         self,
         client: VLLMClient,
         parser: ReasoningParser,
-        batch_size: int,
+        batch_size: Optional[int] = None,
     ) -> List[Dict[str, Any]]:
         """Generate all samples using parallel LLM calls.
         
+        Prompts are handed to vLLM all at once (or in batch_size slices), so
+        its continuous-batching scheduler always has queued requests to fill
+        finished slots with. Each output is parsed as soon as its request
+        completes; failed samples are retried once, together.
+        
         Args:
             client: vLLM client
             parser: Reasoning parser
-            batch_size: Parallel batch size
+            batch_size: Maximum prompts per generate call (None: all at once)
         
         Returns:
             List of generated samples
         """
         num_samples = self.config.dataset.num_samples
+        batch_size = batch_size or num_samples
         samples = []
         
         # Prepare all individual prompts
         all_prompts = [
-            build_generation_prompt(self.config.fields, i + 1)
+            build_generation_prompt(self.config.fields, i + 1, self._prompt_prefix)
             for i in range(num_samples)
         ]
         
@@ -121,33 +203,33 @@ class DatasetGenerator:
         ) as progress:
             
             task = progress.add_task(
-                f"Generating {num_samples} samples (parallel batch size: {batch_size})...",
+                f"Generating {num_samples} samples...",
                 total=num_samples
             )
             
-            # Process prompts in batches for parallelism
+            # Advance per parsed sample, not per batch: with batch_size=None
+            # there is only one batch
+            advance = partial(progress.advance, task)
+            
+            num_failed = 0
             for i in range(0, num_samples, batch_size):
-                batch_prompts = all_prompts[i : i + batch_size]
-                
-                # Generate in parallel
-                batch_outputs = client.generate(batch_prompts, SYSTEM_PROMPT)
-                
-                # Parse results individually
-                for output in batch_outputs:
-                    sample = parser.parse_json_output(output)
-                    if sample:
-                        samples.append(sample)
-                    else:
-                        print(f"\nWarning: A sample failed to parse, retrying once...")
-                        # Simple retry for failed sample
-                        # (In a more robust system, we could re-prompt with different seed/params)
-                        retry_prompt = build_generation_prompt(self.config.fields, len(samples) + 1)
-                        retry_output = client.generate_single(retry_prompt, SYSTEM_PROMPT)
-                        retry_sample = parser.parse_json_output(retry_output)
-                        if retry_sample:
-                            samples.append(retry_sample)
-                
-                progress.update(task, completed=len(samples))
+                batch_samples, batch_failed = asyncio.run(
+                    self._stream_parse(client, parser, all_prompts[i : i + batch_size], advance)
+                )
+                samples.extend(batch_samples)
+                num_failed += batch_failed
+            
+            if num_failed:
+                print(f"\nWarning: {num_failed} sample(s) failed to parse, retrying once...")
+                # Simple retry for failed samples, submitted together
+                # (In a more robust system, we could re-prompt with different seed/params)
+                retry_prompts = [
+                    build_generation_prompt(self.config.fields, len(samples) + k + 1, self._prompt_prefix)
+                    for k in range(num_failed)
+                ]
+                retry_samples, _ = asyncio.run(
+                    self._stream_parse(client, parser, retry_prompts, advance)
+                )
+                samples.extend(retry_samples)
         
         return samples
-    
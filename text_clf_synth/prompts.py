@@ -1,5 +1,7 @@
 """Prompt templates for dataset generation."""
 
+from typing import Optional
+
 
 SYSTEM_PROMPT = """You are a data generation expert. Your task is to generate realistic, high-quality synthetic data for text classification datasets.
 
@@ -12,15 +14,17 @@ You will be given a schema describing the fields to generate. For each sample, y
 Be creative and diverse in your outputs while maintaining logical consistency."""
 
 
-def build_generation_prompt(fields_config: list, sample_num: int) -> str:
-    """Build a prompt for generating a single dataset sample.
+def build_prompt_prefix(fields_config: list) -> str:
+    """Build the sample-independent part of the generation prompt.
+    
+    It is identical for every sample of a dataset, so vLLM's prefix cache
+    can reuse its KV blocks across all requests.
     
     Args:
         fields_config: List of FieldConfig objects
-        sample_num: Current sample number (for variety)
     
     Returns:
-        Formatted prompt string
+        Prompt prefix string
     """
     fields_desc = []
     
@@ -49,7 +53,7 @@ def build_generation_prompt(fields_config: list, sample_num: int) -> str:
     
     json_schema = "{\n" + ",\n".join(json_fields) + "\n}"
     
-    prompt = f"""Generate sample #{sample_num} with the following fields:
+    prefix = f"""Generate a sample with the following fields:
 
 {fields_text}
 
@@ -58,12 +62,29 @@ Think step by step about what makes a realistic, coherent sample. Then output ON
 {json_schema}
 
 Important:
-- Be diverse and creative (this is sample #{sample_num}, make it different from previous samples)
+- Be diverse and creative, make it different from previous samples
 - Maintain logical consistency between fields
 - For text fields, generate complete, realistic content
 - For numeric fields with steps, use the specified step size
 - Output ONLY the JSON, no additional text or markdown formatting"""
     
-    return prompt
+    return prefix
 
 
+def build_generation_prompt(fields_config: list, sample_num: int, prefix: Optional[str] = None) -> str:
+    """Build a prompt for generating a single dataset sample.
+    
+    The sample number goes last so all prompts share the longest possible prefix.
+    
+    Args:
+        fields_config: List of FieldConfig objects
+        sample_num: Current sample number (for variety)
+        prefix: Cached result of build_prompt_prefix(fields_config)
+    
+    Returns:
+        Formatted prompt string
+    """
+    if prefix is None:
+        prefix = build_prompt_prefix(fields_config)
+    
+    return f"{prefix}\n\nThis is sample #{sample_num}."
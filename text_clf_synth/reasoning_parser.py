@@ -4,6 +4,17 @@ import json
 import re
 from typing import Dict, Any, List, Optional
 
+try:
+    # Optional: Rust-based decoder, several times faster on long outputs
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Markdown code fences (```json / ```) around the model's JSON answer
+_MD_FENCE_RE = re.compile(r'```json\s*|```\s*')
+_JSON_DECODER = json.JSONDecoder()
+
 
 class ReasoningParser:
     """Parse structured data from LLM reasoning outputs."""
@@ -27,54 +38,66 @@ class ReasoningParser:
         Returns:
             Parsed JSON dict or None if parsing failed
         """
-        # Try to extract JSON from text
-        json_match = self._extract_json(text)
-        if not json_match:
-            print(f"Warning: Could not extract JSON from output")
-            return None
-        
         try:
-            data = json.loads(json_match)
-            
-            # Validate and clean data
-            cleaned = self._validate_and_clean(data)
-            return cleaned
-        
+            # Extraction already decodes the JSON object
+            data = self._extract_json(text)
         except json.JSONDecodeError as e:
             print(f"Warning: JSON decode error: {e}")
             return None
+        
+        if data is None:
+            print(f"Warning: Could not extract JSON from output")
+            return None
+        
+        # Validate and clean data
+        cleaned = self._validate_and_clean(data)
+        return cleaned
     
     
-    def _extract_json(self, text: str) -> Optional[str]:
-        """Extract JSON object from text.
+    def _extract_json(self, text: str) -> Optional[Dict[str, Any]]:
+        """Extract and decode the first JSON object in text.
+        
+        The common case (a single object, possibly fenced) is decoded in
+        one call, with orjson when installed. Otherwise decoding starts at
+        each '{' in turn with JSONDecoder.raw_decode, which stops at the
+        end of the object.
         
         Args:
             text: Text containing JSON
         
         Returns:
-            JSON string or None
+            Decoded JSON object or None if text contains no '{'
+        
+        Raises:
+            json.JSONDecodeError: If no '{' starts a valid JSON object
         """
         # Remove markdown code blocks if present
-        text = re.sub(r'```json\s*', '', text)
-        text = re.sub(r'```\s*', '', text)
-        
-        # Try to find JSON object
-        # Look for outermost { }
-        stack = []
-        start_idx = None
-        
-        for i, char in enumerate(text):
-            if char == '{':
-                if not stack:
-                    start_idx = i
-                stack.append(char)
-            elif char == '}':
-                if stack:
-                    stack.pop()
-                    if not stack and start_idx is not None:
-                        # Found complete JSON object
-                        return text[start_idx:i+1]
+        if '```' in text:
+            text = _MD_FENCE_RE.sub('', text)
+        
+        start = text.find('{')
+        if start < 0:
+            return None
+        
+        try:
+            data = _json_loads(text[start:text.rfind('}') + 1])
+            if isinstance(data, dict):
+                return data
+        except json.JSONDecodeError:
+            # orjson.JSONDecodeError subclasses json.JSONDecodeError
+            pass
+        
+        error = None
+        while start >= 0:
+            try:
+                data, _ = _JSON_DECODER.raw_decode(text, start)
+                return data
+            except json.JSONDecodeError as e:
+                error = error or e
+            start = text.find('{', start + 1)
         
+        if error:
+            raise error
         return None
     
     
@@ -8,6 +8,7 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
 from config_schema import RootConfig
+from pydantic import ValidationError
 import yaml
 
 
@@ -51,5 +52,45 @@ def test_ielts_config():
     print("\n✅ All tests passed!")
 
 
+def test_duplicate_field_names():
+    """Test that duplicate field names are rejected."""
+    config_path = Path(__file__).parent / "examples" / "ielts_task2.yaml"
+    
+    with open(config_path, 'r') as f:
+        data = yaml.safe_load(f)
+    
+    data["fields"].append(dict(data["fields"][0]))
+    
+    try:
+        RootConfig(**data)
+    except ValidationError as e:
+        assert f"Duplicate field name: {data['fields'][0]['name']}" in str(e)
+        print("✓ Duplicate field name rejected")
+    else:
+        raise AssertionError("Config with duplicate field names was accepted")
+
+
+def test_speculative_model():
+    """Test that only n-gram speculative decoding is accepted."""
+    config_path = Path(__file__).parent / "examples" / "ielts_task2.yaml"
+    
+    with open(config_path, 'r') as f:
+        data = yaml.safe_load(f)
+    
+    data["model"]["speculative_model"] = "[ngram]"
+    assert RootConfig(**data).model.speculative_model == "[ngram]"
+    
+    # Draft models fail at engine start on the pinned vLLM
+    data["model"]["speculative_model"] = "google/gemma-3-1b-it"
+    try:
+        RootConfig(**data)
+    except ValidationError:
+        print("✓ Draft speculative model rejected")
+    else:
+        raise AssertionError("Config with a draft speculative model was accepted")
+
+
 if __name__ == "__main__":
     test_ielts_config()
+    test_duplicate_field_names()
+    test_speculative_model()
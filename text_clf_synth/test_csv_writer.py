@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""Simple tests for the CSV train/test split."""
+
+import csv
+import sys
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+# Add text-clf-synth to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from csv_writer import CSVWriter
+
+
+FIELD_NAMES = ["id", "label"]
+
+# 20 "a", 10 "b", 5 "c"
+SAMPLES = [
+    {"id": str(i), "label": label}
+    for i, label in enumerate(["a"] * 20 + ["b"] * 10 + ["c"] * 5)
+]
+
+
+def _read_rows(path: Path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def _write_split(out_dir: Path, stratify_field=None):
+    writer = CSVWriter(
+        str(out_dir / "train.csv"),
+        str(out_dir / "test.csv"),
+        FIELD_NAMES,
+        train_ratio=0.8,
+        stratify_field=stratify_field,
+    )
+    writer.write_data(SAMPLES)
+    return _read_rows(out_dir / "train.csv"), _read_rows(out_dir / "test.csv")
+
+
+def test_random_split_sizes():
+    """Test that the random split keeps every sample exactly once at the given ratio."""
+    with tempfile.TemporaryDirectory() as tmp:
+        train, test = _write_split(Path(tmp))
+
+    assert len(train) == int(len(SAMPLES) * 0.8)
+    assert len(test) == len(SAMPLES) - len(train)
+    assert sorted(row["id"] for row in train + test) == sorted(s["id"] for s in SAMPLES)
+    print("✓ Random split sizes preserved")
+
+
+def test_stratified_split_counts():
+    """Test that each stratum is split at the ratio and no sample is lost."""
+    with tempfile.TemporaryDirectory() as tmp:
+        train, test = _write_split(Path(tmp), stratify_field="label")
+
+    train_counts = Counter(row["label"] for row in train)
+    test_counts = Counter(row["label"] for row in test)
+    assert train_counts == {"a": 16, "b": 8, "c": 4}
+    assert test_counts == {"a": 4, "b": 2, "c": 1}
+    assert sorted(row["id"] for row in train + test) == sorted(s["id"] for s in SAMPLES)
+    print("✓ Stratified group counts preserved")
+
+
+if __name__ == "__main__":
+    test_random_split_sizes()
+    test_stratified_split_counts()
+    print("\n✅ All tests passed!")
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Simple tests for JSON extraction from model outputs."""
+
+import json
+import sys
+from pathlib import Path
+
+# Add text-clf-synth to path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config_schema import FieldConfig
+from reasoning_parser import ReasoningParser
+
+
+FIELDS = [
+    FieldConfig(name="topic", type="text", description="Essay topic"),
+    FieldConfig(name="score", type="numeric", description="Band score", range=[4.0, 9.0], step=0.5),
+]
+
+
+def test_fenced_object():
+    """Test that a JSON object inside a markdown fence is extracted."""
+    parser = ReasoningParser(FIELDS)
+    text = 'Here is the sample:\n```json\n{"topic": "Cities", "score": 6.5}\n```'
+
+    assert parser.parse_json_output(text) == {"topic": "Cities", "score": 6.5}
+    print("✓ Fenced object extracted")
+
+
+def test_brace_inside_string():
+    """Test that braces inside string values do not end the object."""
+    parser = ReasoningParser(FIELDS)
+    # Trailing text with its own braces forces the raw_decode scan
+    text = '{"topic": "Use {placeholders} } carefully", "score": 7}\nNote: {done}'
+
+    assert parser.parse_json_output(text) == {"topic": "Use {placeholders} } carefully", "score": 7.0}
+    print("✓ Brace inside string value handled")
+
+
+def test_braces_in_reasoning():
+    """Test that non-JSON braces in the reasoning before the answer are skipped."""
+    parser = ReasoningParser(FIELDS)
+    text = (
+        "The score should be in {4.0, ..., 9.0}, so I pick 6.\n"
+        '{"topic": "Transport", "score": 6}\n'
+        "Done."
+    )
+
+    assert parser.parse_json_output(text) == {"topic": "Transport", "score": 6.0}
+    print("✓ Non-JSON braces before the answer skipped")
+
+
+def test_no_json():
+    """Test that text without any JSON object yields None."""
+    parser = ReasoningParser(FIELDS)
+    text = "I could not come up with a sample."
+
+    assert parser._extract_json(text) is None
+    assert parser.parse_json_output(text) is None
+    print("✓ Output without JSON rejected")
+
+
+def test_malformed_json():
+    """Test that a truncated JSON object raises in extraction and yields None."""
+    parser = ReasoningParser(FIELDS)
+    text = '{"topic": "Education", "score": 5.5,'
+
+    try:
+        parser._extract_json(text)
+    except json.JSONDecodeError:
+        pass
+    else:
+        raise AssertionError("Malformed JSON was decoded")
+    assert parser.parse_json_output(text) is None
+    print("✓ Malformed JSON rejected")
+
+
+if __name__ == "__main__":
+    test_fenced_object()
+    test_brace_inside_string()
+    test_braces_in_reasoning()
+    test_no_json()
+    test_malformed_json()
+    print("\n✅ All tests passed!")
@@ -1,13 +1,53 @@
 """vLLM client wrapper for text generation."""
 
+import asyncio
 import json
-from typing import List, Dict, Any, Optional
-from dataclasses import asdict
-from vllm import LLM, SamplingParams, EngineArgs
+import logging
+import threading
+import uuid
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
+import numpy as np
+from transformers import AutoConfig
+from vllm import AsyncEngineArgs, AsyncLLMEngine, SamplingParams
+from vllm.inputs import TokensPrompt
+from vllm.platforms import current_platform
+from vllm.sampling_params import RequestOutputKind
+
+logger = logging.getLogger(__name__)
+
+
+def _speculative_config(speculative_model: Optional[str], num_speculative_tokens: int) -> Optional[Dict[str, Any]]:
+    """Build vLLM's speculative_config for n-gram (prompt lookup) drafting."""
+    if not speculative_model:
+        return None
+    if speculative_model != "[ngram]":
+        # vLLM 0.11 raises NotImplementedError for separate draft models
+        raise ValueError(f"Unsupported speculative_model {speculative_model!r}: only '[ngram]' is supported")
+    return {"method": "ngram", "num_speculative_tokens": num_speculative_tokens, "prompt_lookup_max": 4}
+
+
+def _checkpoint_quant_method(model_path: str) -> Optional[str]:
+    """Quantization method declared in the checkpoint's config.json, if any."""
+    quant_config = getattr(AutoConfig.from_pretrained(model_path, trust_remote_code=True),
+                           "quantization_config", None) or {}
+    if not isinstance(quant_config, dict):
+        quant_config = quant_config.to_dict()
+    return quant_config.get("quant_method")
+
+
+def _length_order(token_ids: List[List[int]]) -> np.ndarray:
+    """Indices that sort tokenized prompts by length (stable)."""
+    return np.argsort([len(ids) for ids in token_ids], kind="stable")
 
 
 class VLLMClient:
-    """Wrapper for vLLM model inference."""
+    """Wrapper for vLLM model inference.
+
+    The engine is an AsyncLLMEngine driven by an event loop on a background
+    thread, so concurrent callers (e.g. several threads calling
+    generate_single, or tasks awaiting agenerate_single) share the same
+    scheduler steps through continuous batching.
+    """
     
     def __init__(
         self,
@@ -16,8 +56,15 @@ class VLLMClient:
         max_tokens: int = 4096,
         tensor_parallel_size: int = 1,
         quantization: Optional[str] = None,
+        kv_cache_dtype: str = "auto",
         max_model_len: int = 8192,
-        gpu_memory_utilization: float = 0.9,
+        gpu_memory_utilization: Optional[float] = None,
+        max_num_seqs: int = 32,
+        max_num_batched_tokens: int = 8192,
+        dtype: str = "bfloat16",
+        enforce_eager: bool = False,
+        speculative_model: Optional[str] = None,
+        num_speculative_tokens: int = 5,
     ):
         """Initialize vLLM client.
         
@@ -26,120 +73,274 @@ class VLLMClient:
             temperature: Sampling temperature
             max_tokens: Maximum tokens to generate
             tensor_parallel_size: Number of GPUs for tensor parallelism
-            quantization: Quantization method (awq, gptq, None)
+            quantization: Quantization method (awq, awq_marlin, gptq, fp8, None).
+                With None, vLLM reads the checkpoint's config and runs AWQ
+                checkpoints on the faster Marlin kernels when the GPU supports
+                them; an explicit "awq" forces the plain AWQ kernels
+            kv_cache_dtype: KV cache data type: "auto" (model dtype), "fp8"/"fp8_e4m3"
+                (Hopper/Ada) or "fp8_e5m2" (Ampere). FP8 halves KV memory and
+                bandwidth, roughly doubling concurrent sequences, at a small
+                accuracy cost
             max_model_len: Maximum model context length (reduce if OOM)
-            gpu_memory_utilization: Fraction of GPU memory to use (0.0-1.0)
+            gpu_memory_utilization: Fraction of GPU memory to use (0.0-1.0). None uses
+                0.95 in eager mode and 0.9 with CUDA graphs, whose memory vLLM's
+                profiling does not fully account for
+            max_num_seqs: Maximum number of sequences scheduled concurrently;
+                size it to the workload rather than vLLM's default of 256
+            max_num_batched_tokens: Maximum number of tokens per scheduler step
+            dtype: Activation dtype. bfloat16 falls back to "auto" on GPUs older than
+                Ampere (no native bf16) and whenever the plain AWQ kernels may run,
+                which are fp16-only: with quantization="awq", or an AWQ checkpoint
+                and quantization=None (vLLM uses plain AWQ if Marlin can't take it)
+            enforce_eager: Run the model eagerly instead of capturing CUDA graphs.
+                Graph capture makes the first start-up slower but removes per-step
+                kernel launch overhead during decoding.
+            speculative_model: "[ngram]" for prompt-lookup drafting; None disables
+                speculative decoding. Separate draft models (e.g. a small model of
+                the same family) are not supported by the pinned vLLM
+            num_speculative_tokens: Draft tokens proposed per target-model step
         """
         self.model_path = model_path
         self.temperature = temperature
         self.max_tokens = max_tokens
+        # bf16 needs compute capability 8.0 (Ampere); queried through NVML so
+        # CUDA is not initialized before vLLM starts its engine process
+        if dtype == "bfloat16" and (
+            not current_platform.has_device_capability(80)
+            or (quantization or _checkpoint_quant_method(model_path)) == "awq"
+        ):
+            dtype = "auto"
+        if gpu_memory_utilization is None:
+            gpu_memory_utilization = 0.95 if enforce_eager else 0.9
         
-        print(f"Loading model: {model_path}")
-        print(f"  Tensor parallel size: {tensor_parallel_size}")
-        print(f"  Quantization: {quantization}")
+        logger.info("Loading model: %s", model_path)
+        logger.info("  Tensor parallel size: %d", tensor_parallel_size)
+        logger.info("  Quantization: %s", quantization)
+        logger.info("  Dtype: %s", dtype)
+        logger.info("  KV cache dtype: %s", kv_cache_dtype)
+        logger.info("  GPU memory utilization: %s", gpu_memory_utilization)
+        if speculative_model:
+            logger.info("  Speculative decoding: %s (%d tokens)", speculative_model, num_speculative_tokens)
+        logger.info("  CUDA graphs: %s", "disabled" if enforce_eager else "enabled (capture adds start-up time)")
         
-        # Create EngineArgs pattern as requested
-        engine_args = EngineArgs(
+        engine_args = AsyncEngineArgs(
             model=model_path,
             tensor_parallel_size=tensor_parallel_size,
             quantization=quantization,
+            kv_cache_dtype=kv_cache_dtype,
             trust_remote_code=True,
             max_model_len=max_model_len,
             gpu_memory_utilization=gpu_memory_utilization,
-            enforce_eager=True,
-            dtype="auto", 
+            max_num_seqs=max_num_seqs,
+            max_num_batched_tokens=max_num_batched_tokens,
+            enforce_eager=enforce_eager,
+            # Prompts share the system prompt and field spec: reuse their KV blocks
+            enable_prefix_caching=True,
+            speculative_config=_speculative_config(speculative_model, num_speculative_tokens),
+            dtype=dtype,
         )
         
-        # Convert to dict for initialization
-        engine_args_dict = asdict(engine_args)
-        
-        self.llm = LLM(**engine_args_dict)
+        self.engine = AsyncLLMEngine.from_engine_args(engine_args)
+
+        # The engine's background tasks live on this loop for the client's lifetime
+        self._loop = asyncio.new_event_loop()
+        self._loop_thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._loop_thread.start()
+
+        # Prompts are tokenized with the model's own chat template
+        self.tokenizer = self._run(self.engine.get_tokenizer())
         
-        self.sampling_params = SamplingParams(
+        self._sampling_kwargs = dict(
             temperature=temperature,
             max_tokens=max_tokens,
             stop=None,  # Let model generate naturally
+            # Only the finished text is used: skip per-step partial outputs
+            output_kind=RequestOutputKind.FINAL_ONLY,
+            # Return token ids only; the texts are decoded in one batch per call
+            detokenize=False,
         )
+        self.sampling_params = SamplingParams(**self._sampling_kwargs)
         
-        print("Model loaded successfully!")
+        # Size of the KV cache pool, to tune gpu_memory_utilization / max_num_seqs
+        cache_config = self.engine.vllm_config.cache_config
+        logger.info("  KV cache blocks: %s x %d tokens", cache_config.num_gpu_blocks, cache_config.block_size)
+        logger.info("Model loaded successfully!")
     
     def generate(
         self,
         prompts: List[str],
         system_prompt: Optional[str] = None,
+        sampling_overrides: Optional[Dict[str, Any]] = None,
     ) -> List[str]:
         """Generate text from prompts.
         
         Args:
             prompts: List of user prompts
             system_prompt: Optional system prompt to prepend
+            sampling_overrides: SamplingParams fields to change for this call
+                (e.g. {"max_tokens": 512}); the defaults are left untouched.
+                Stop strings also need {"detokenize": True}
         
         Returns:
             List of generated texts
         """
-        # Format prompts for chat models
-        formatted_prompts = []
-        for prompt in prompts:
-            if system_prompt:
-                # Format as chat for instruction-tuned models
-                formatted = self._format_chat(system_prompt, prompt)
-            else:
-                formatted = self._format_chat("", prompt)
-            formatted_prompts.append(formatted)
-        
-        # Generate
-        outputs = self.llm.generate(formatted_prompts, self.sampling_params)
-        
-        # Extract generated text
-        results = []
-        for output in outputs:
-            text = output.outputs[0].text.strip()
-            results.append(text)
-        
-        return results
+        # One batched call to the fast (Rust) tokenizer for the whole batch.
+        # Nothing is submitted until every prompt is tokenized; the batched
+        # call is still cheaper than tokenizing per request on the engine loop
+        token_ids = self._encode_chats(system_prompt, prompts)
+        
+        # Submit in order of prompt length so prefill steps group similar
+        # lengths, then restore the caller's order
+        order = _length_order(token_ids)
+        inverse = np.empty_like(order)
+        inverse[order] = np.arange(len(order))
+        
+        sampling_params = self._sampling_params_for(sampling_overrides)
+        outputs = self._run(self._generate_all([token_ids[i] for i in order], sampling_params))
+        return self._decode([outputs[i] for i in inverse])
+
+    async def generate_stream(
+        self,
+        prompts: List[str],
+        system_prompt: Optional[str] = None,
+        sampling_overrides: Optional[Dict[str, Any]] = None,
+    ) -> AsyncIterator[Tuple[int, str]]:
+        """Generate text from prompts, yielding results as they finish.
+        
+        Lets callers parse or write each result while the remaining requests
+        are still decoding. Can be iterated from any event loop; requests that
+        are still running when the iteration stops early are aborted.
+        
+        Args:
+            prompts: List of user prompts
+            system_prompt: Optional system prompt to prepend
+            sampling_overrides: SamplingParams fields to change for this call
+        
+        Yields:
+            (index into prompts, generated text) in completion order
+        """
+        token_ids = self._encode_chats(system_prompt, prompts)
+        sampling_params = self._sampling_params_for(sampling_overrides)
+        
+        futures = {
+            int(i): self._submit(self._generate_one(token_ids[i], sampling_params))
+            for i in _length_order(token_ids)
+        }
+        
+        async def indexed(idx, future):
+            return idx, await asyncio.wrap_future(future)
+        
+        try:
+            for next_done in asyncio.as_completed([indexed(i, f) for i, f in futures.items()]):
+                idx, output = await next_done
+                yield idx, self._decode([output])[0]
+        finally:
+            for future in futures.values():
+                future.cancel()
+
+    def _sampling_params_for(self, overrides: Optional[Dict[str, Any]]) -> SamplingParams:
+        """Return the default sampling params, or a copy with overrides applied."""
+        if not overrides:
+            return self.sampling_params
+        return SamplingParams(**{**self._sampling_kwargs, **overrides})
+
+    def _submit(self, coro):
+        """Schedule a coroutine on the engine loop; returns a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def _run(self, coro):
+        """Run a coroutine on the engine loop and block until it finishes."""
+        return self._submit(coro).result()
+
+    async def _generate_one(self, prompt_token_ids: List[int], sampling_params: SamplingParams):
+        """Submit one tokenized prompt and return its final RequestOutput."""
+        final_output = None
+        async for output in self.engine.generate(
+            TokensPrompt(prompt_token_ids=prompt_token_ids), sampling_params,
+            request_id=uuid.uuid4().hex,
+        ):
+            final_output = output
+        return final_output
+
+    async def _generate_all(self, token_ids: List[List[int]], sampling_params: SamplingParams):
+        """Submit all prompts at once so the scheduler batches them together."""
+        return await asyncio.gather(*(self._generate_one(ids, sampling_params) for ids in token_ids))
+
+    def _decode(self, outputs) -> List[str]:
+        """Detokenize finished outputs in one batched tokenizer call."""
+        texts = self.tokenizer.batch_decode(
+            [output.outputs[0].token_ids for output in outputs], skip_special_tokens=True
+        )
+        return [text.strip() for text in texts]
     
-    def _format_chat(self, system_prompt: str, user_prompt: str) -> str:
-        """Format prompts for chat models.
+    def _encode_chats(self, system_prompt: Optional[str], user_prompts: List[str]) -> List[List[int]]:
+        """Tokenize prompts with the model's chat template.
+        
+        All conversations go through a single batched apply_chat_template
+        call, which tokenizes them together with the fast tokenizer.
         
         Args:
-            system_prompt: System instruction
-            user_prompt: User message
+            system_prompt: Optional system instruction
+            user_prompts: User messages
         
         Returns:
-            Formatted prompt string
+            Prompt token ids, each ending with the assistant generation prompt
         """
-        # Gemma 3 format (adjust if using different model)
-        # https://developers.googleblog.com/en/introducing-gemma3/
-        formatted = f"""<bos><start_of_turn>user
-{system_prompt}
-
-{user_prompt}<end_of_turn>
-<start_of_turn>model
-"""
-        return formatted
+        system_messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+        conversations = [system_messages + [{"role": "user", "content": prompt}] for prompt in user_prompts]
+        return self.tokenizer.apply_chat_template(
+            conversations, add_generation_prompt=True, tokenize=True, padding=False
+        )
     
-    def generate_single(
+    async def agenerate_single(
         self,
         prompt: str,
         system_prompt: Optional[str] = None,
+        sampling_overrides: Optional[Dict[str, Any]] = None,
     ) -> str:
         """Generate text from a single prompt.
+
+        Can be awaited from any event loop; the request itself runs on the
+        engine loop, and concurrent calls are scheduled together.
         
         Args:
             prompt: User prompt
             system_prompt: Optional system prompt
+            sampling_overrides: SamplingParams fields to change for this call
         
         Returns:
             Generated text
         """
-        formatted = self._format_chat("", prompt)
+        token_ids = self._encode_chats(system_prompt, [prompt])[0]
+        sampling_params = self._sampling_params_for(sampling_overrides)
+        output = await asyncio.wrap_future(self._submit(self._generate_one(token_ids, sampling_params)))
+        return self._decode([output])[0]
+
+    def generate_single(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        sampling_overrides: Optional[Dict[str, Any]] = None,
+    ) -> str:
+        """Generate text from a single prompt.
 
-        results = self.generate([formatted], system_prompt)
-        return results[0]
+        Blocking wrapper around agenerate_single; safe to call from several
+        threads at once, in which case the requests are batched together.
+        
+        Args:
+            prompt: User prompt
+            system_prompt: Optional system prompt
+            sampling_overrides: SamplingParams fields to change for this call
+        
+        Returns:
+            Generated text
+        """
+        return self._run(self.agenerate_single(prompt, system_prompt, sampling_overrides))
 
 
 if __name__ == "__main__":
     # test load & inference model
+    logging.basicConfig(level=logging.INFO)
 
     client = VLLMClient(model_path="/home/tnguyenho/workspace/llm-checkpoints/gemma-3-27b-it-qat-autoawq")
     print(